@@ -1,12 +1,14 @@
-from asyncio import StreamReader, StreamWriter, open_connection
+from asyncio import IncompleteReadError, StreamReader, StreamWriter, get_running_loop, open_connection
+from collections import defaultdict
 from contextlib import asynccontextmanager, contextmanager, ExitStack
 from dataclasses import dataclass, field
 from enum import Enum
 from fractions import Fraction
+from functools import lru_cache
 from itertools import product
 from os import urandom
-from typing import Callable, Dict, List, Optional, Set, Tuple
-from zlib import decompressobj
+from struct import Struct
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple, Union
 
 import numpy as np
 
@@ -16,6 +18,11 @@ from cryptography.hazmat.primitives.serialization import load_der_public_key
 
 from keysymdef import keysymdef  # type: ignore
 
+try:
+    from isal.isal_zlib import decompressobj
+except ImportError:
+    from zlib import decompressobj  # type: ignore
+
 
 # Keyboard keys
 key_codes: Dict[str, int] = {}
@@ -42,16 +49,139 @@ video_modes: Dict[bytes, str] = {
      b'\x20\x18\x01\x01\x00\xff\x00\xff\x00\xff\x00\x08\x10': 'abgr',
 }
 
+# Index of the alpha channel in each colour channel order
+alpha_indices: Dict[str, int] = {mode: mode.index('a') for mode in video_modes.values()}
+
+# Masks that set the alpha byte of a whole pixel in each colour channel order
+alpha_masks: Dict[str, np.ndarray] = {
+    mode: np.array([255 * (channel == 'a') for channel in mode], 'B').view(np.uint32) for mode in video_modes.values()}
+
+# Corner types of each 2x2 neighbourhood, indexed by its opaque pixels (a=bottom right, b=bottom left, c=top
+# right, d=top left) and flagging top left, top right, bottom left and bottom right corners respectively.
+corner_types: np.ndarray = np.array([
+    (a & ~b & ~c) | (b & ~a & ~d) << 1 | (c & ~a & ~d) << 2 | (d & ~b & ~c) << 3
+    for d, c, b, a in product((0, 1), repeat=4)], 'B')
+
+# Channel indices that reorder each colour channel order to RGBA
+rgba_indices: Dict[str, np.ndarray] = {
+    mode: np.array([mode.index(channel) for channel in 'rgba']) for mode in video_modes.values()}
+
+# Server message formats
+int_formats = {length: Struct(f'>{code}') for length, code in ((1, 'B'), (2, 'H'), (4, 'I'))}
+update_header = Struct('>xH')
+rect_header = Struct('>HHHHI')
+clipboard_text_header = Struct('>3xI')
+server_init = Struct('>HH13s3xI')  # width, height, pixel format, name length
+host_key_header = Struct('>4x2xI')  # packet length, packet version, key length
+
+# Client message formats
+key_event = Struct('>BBxxI')
+pointer_event = Struct('>BBHH')
+update_request = Struct('>BBHHHH')
+clipboard_header = Struct('>BxI')
+
+# Key down and key up messages for each known key code
+key_strokes: Dict[int, bytes] = {
+    code: key_event.pack(4, 1, code) + key_event.pack(4, 0, code) for code in set(key_codes.values())}
+
+# Bytes with their bit order reversed, as used by VNC authentication's DES keys
+reversed_bits = bytes(int(f'{n:08b}'[::-1], 2) for n in range(256))
+
+
+@dataclass
+class BufferedReader:
+    """
+    Stream reader wrapper that serves small reads from a local buffer.
+    """
+
+    reader: StreamReader = field(repr=False)
+    buffer: bytearray = field(default_factory=bytearray, repr=False)
+    offset: int = 0
+
+    #: Number of bytes to request from the stream when the buffer runs dry.
+    chunk_size: int = 65536
+
+    #: Maximum length of a line returned by :meth:`readline`.
+    line_limit: int = 65536
+
+    async def readexactly(self, length: int) -> bytes:
+        """
+        Reads and returns exactly *length* bytes.
+        """
+
+        end = self.offset + length
+        if end <= len(self.buffer):
+            data = bytes(self.buffer[self.offset:end])
+            self.offset = end
+            return data
+
+        # Take what remains in the buffer; large payloads bypass it entirely.
+        data = bytes(self.buffer[self.offset:])
+        self.buffer.clear()
+        self.offset = 0
+        if length - len(data) >= self.chunk_size:
+            return data + await self.reader.readexactly(length - len(data))
+
+        self.buffer += data
+        while len(self.buffer) < length:
+            chunk = await self.reader.read(self.chunk_size)
+            if not chunk:
+                raise IncompleteReadError(bytes(self.buffer), length)
+            self.buffer += chunk
+        self.offset = length
+        return bytes(self.buffer[:length])
+
+    async def readinto(self, view: memoryview) -> None:
+        """
+        Reads exactly enough bytes to fill *view*.
+        """
+
+        length = len(view)
+        position = min(length, len(self.buffer) - self.offset)
+        view[:position] = self.buffer[self.offset:self.offset + position]
+        self.offset += position
+        while position < length:
+            chunk = await self.reader.read(length - position)
+            if not chunk:
+                raise IncompleteReadError(bytes(view[:position]), length)
+            view[position:position + len(chunk)] = chunk
+            position += len(chunk)
+
+    async def readline(self) -> bytes:
+        """
+        Reads and returns one line, including its trailing newline.
+        """
+
+        start = self.offset
+        while True:
+            end = self.buffer.find(b'\n', start) + 1
+            if end:
+                break
+            if len(self.buffer) - self.offset > self.line_limit:
+                raise ValueError('line is too long')
+            start = len(self.buffer)
+            chunk = await self.reader.read(self.chunk_size)
+            if not chunk:
+                end = len(self.buffer)
+                break
+            self.buffer += chunk
+        if end - self.offset > self.line_limit:
+            raise ValueError('line is too long')
+        data = bytes(self.buffer[self.offset:end])
+        self.offset = end
+        return data
+
 
-async def read_int(reader: StreamReader, length: int) -> int:
+async def read_int(reader: BufferedReader, length: int) -> int:
     """
     Reads, unpacks, and returns an integer of *length* bytes.
     """
 
-    return int.from_bytes(await reader.readexactly(length), 'big')
+    value: int = int_formats[length].unpack(await reader.readexactly(length))[0]
+    return value
 
 
-async def read_text(reader: StreamReader, encoding: str) -> str:
+async def read_text(reader: BufferedReader, encoding: str) -> str:
     """
     Reads, unpacks, and returns length-prefixed text.
     """
@@ -61,6 +191,19 @@ async def read_text(reader: StreamReader, encoding: str) -> str:
     return data.decode(encoding)
 
 
+@lru_cache(maxsize=1024)
+def aspect_weight(width: int, height: int) -> float:
+    """
+    Returns the factor applied to a rectangle's area when scoring it as a screen.
+    """
+
+    ratios = {Fraction(width, height).limit_denominator(64),
+              Fraction(height, width).limit_denominator(64)}
+    if ratios & screen_ratios:
+        return 1.0
+    return float(min(ratios)) * 0.5
+
+
 def pack_ard(data):
     data = data.encode('utf-8') + b'\x00'
     if len(data) < 64:
@@ -87,7 +230,7 @@ class Clipboard:
         """
 
         data = text.encode('latin-1')
-        self.writer.write(b'\x06\x00' + len(data).to_bytes(4, 'big') + data)
+        self.writer.write(clipboard_header.pack(6, len(data)) + data)
 
 
 @dataclass
@@ -100,12 +243,12 @@ class Keyboard:
 
     @contextmanager
     def _write(self, key: str):
-        data = key_codes[key].to_bytes(4, 'big')
-        self.writer.write(b'\x04\x01\x00\x00' + data)
+        key_code = key_codes[key]
+        self.writer.write(key_event.pack(4, 1, key_code))
         try:
             yield
         finally:
-            self.writer.write(b'\x04\x00\x00\x00' + data)
+            self.writer.write(key_event.pack(4, 0, key_code))
 
     @contextmanager
     def hold(self, *keys: str):
@@ -131,9 +274,11 @@ class Keyboard:
         Pushes and releases each of the given keys, one after the other.
         """
 
+        data = bytearray()
         for key in text:
-            with self.hold(key):
-                pass
+            key_code = key_codes[key]
+            data += key_strokes.get(key_code) or key_event.pack(4, 1, key_code) + key_event.pack(4, 0, key_code)
+        self.writer.write(data)
 
 
 @dataclass
@@ -148,11 +293,13 @@ class Mouse:
     y: int = 0
 
     def _write(self):
-        self.writer.write(
-            b'\x05' +
-            self.buttons.to_bytes(1, 'big') +
-            self.x.to_bytes(2, 'big') +
-            self.y.to_bytes(2, 'big'))
+        self.writer.write(pointer_event.pack(5, self.buttons, self.x, self.y))
+
+    def _click(self, button: int) -> bytes:
+        mask = 1 << button
+        self.buttons &= ~mask
+        return (pointer_event.pack(5, self.buttons | mask, self.x, self.y) +
+                pointer_event.pack(5, self.buttons, self.x, self.y))
 
     @contextmanager
     def hold(self, button: int = 0):
@@ -174,8 +321,7 @@ class Mouse:
         Presses and releases a mouse button.
         """
 
-        with self.hold(button):
-            pass
+        self.writer.write(self._click(button))
 
     def middle_click(self):
         """
@@ -196,16 +342,14 @@ class Mouse:
         Scrolls the mouse wheel upwards.
         """
 
-        for _ in range(repeat):
-            self.click(3)
+        self.writer.write(self._click(3) * repeat)
 
     def scroll_down(self, repeat=1):
         """
         Scrolls the mouse wheel downwards.
         """
 
-        for _ in range(repeat):
-            self.click(4)
+        self.writer.write(self._click(4) * repeat)
 
     def move(self, x: int, y: int):
         """
@@ -216,6 +360,20 @@ class Mouse:
         self.y = y
         self._write()
 
+    def move_path(self, points: Iterable[Tuple[int, int]]) -> None:
+        """
+        Moves the mouse cursor through the given co-ordinates, skipping any that don't change its position.
+        """
+
+        data = bytearray()
+        for x, y in points:
+            if (x, y) != (self.x, self.y):
+                self.x = x
+                self.y = y
+                data += pointer_event.pack(5, self.buttons, x, y)
+        if data:
+            self.writer.write(data)
+
 
 @dataclass
 class Screen:
@@ -251,12 +409,7 @@ class Screen:
         or its reciprocal, whichever is smaller.
         """
 
-        value = float(self.width * self.height)
-        ratios = {Fraction(self.width, self.height).limit_denominator(64),
-                  Fraction(self.height, self.width).limit_denominator(64)}
-        if not ratios & screen_ratios:
-            value *= min(ratios) * 0.5
-        return value
+        return float(self.width * self.height) * aspect_weight(self.width, self.height)
 
 
 @dataclass
@@ -265,9 +418,9 @@ class Video:
     Video buffer.
     """
 
-    reader: StreamReader = field(repr=False)
+    reader: BufferedReader = field(repr=False)
     writer: StreamWriter = field(repr=False)
-    decompress: Callable[[bytes], bytes] = field(repr=False)
+    decompress: Callable[[memoryview], bytes] = field(repr=False)
 
     #: Desktop name.
     name: str
@@ -284,17 +437,21 @@ class Video:
     #: 3D numpy array of colour data.
     data: Optional[np.ndarray] = None
 
+    #: Scratch space for pixel data that can't be read in place.
+    buffer: bytearray = field(default_factory=bytearray, repr=False)
+
+    #: Compressed payloads at least this many bytes long are decompressed in a worker thread.
+    executor_threshold: int = field(default=65536, repr=False)
+
     @classmethod
-    async def create(cls, reader: StreamReader, writer: StreamWriter) -> 'Video':
+    async def create(cls, reader: BufferedReader, writer: StreamWriter) -> 'Video':
         writer.write(b'\x01')
-        width = await read_int(reader, 2)
-        height = await read_int(reader, 2)
-        mode_data = bytearray(await reader.readexactly(13))
+        width, height, pixel_format, name_length = server_init.unpack(await reader.readexactly(server_init.size))
+        mode_data = bytearray(pixel_format)
         mode_data[2] &= 1  # set big endian flag to 0 or 1
         mode_data[3] &= 1  # set true colour flag to 0 or 1
         mode = video_modes.get(bytes(mode_data))
-        await reader.readexactly(3)  # padding
-        name = await read_text(reader, 'utf-8')
+        name = (await reader.readexactly(name_length)).decode('utf-8')
 
         if mode is None:
             mode = 'rgba'
@@ -314,51 +471,72 @@ class Video:
             width = self.width
         if height is None:
             height = self.height
-        self.writer.write(
-            b'\x03' +
-            incremental.to_bytes(1, 'big') +
-            x.to_bytes(2, 'big') +
-            y.to_bytes(2, 'big') +
-            width.to_bytes(2, 'big') +
-            height.to_bytes(2, 'big'))
+        self.writer.write(update_request.pack(3, incremental, x, y, width, height))
 
     async def read(self):
-        x = await read_int(self.reader, 2)
-        y = await read_int(self.reader, 2)
-        width = await read_int(self.reader, 2)
-        height = await read_int(self.reader, 2)
-        encoding = await read_int(self.reader, 4)
+        x, y, width, height, encoding = rect_header.unpack(await self.reader.readexactly(rect_header.size))
+        if x + width > self.width or y + height > self.height:
+            raise ValueError(f'rectangle out of bounds: {width}x{height} at ({x}, {y})')
+        if encoding not in (0, 6):
+            raise ValueError(encoding)
+        size = width * height * 4
 
+        data: Union[bytes, memoryview]
         if encoding == 0:  # Raw
-            data = await self.reader.readexactly(height * width * 4)
+            data = await self.read_buffer(size)
         elif encoding == 6:  # ZLib
             length = await read_int(self.reader, 4)
-            data = await self.reader.readexactly(length)
-            data = self.decompress(data)
-        else:
-            raise ValueError(encoding)
+            # Deflate can't expand data by more than a fraction of a percent, plus a few bytes of framing.
+            if length > size + (size >> 10) + 1024:
+                raise ValueError(f'compressed data too long: {length} bytes for {width}x{height} pixels')
+            payload = await self.read_buffer(length)
+            if length < self.executor_threshold:
+                data = self.decompress(payload)
+            else:
+                # Large payloads take milliseconds to inflate, so keep the event loop free meanwhile.
+                data = await get_running_loop().run_in_executor(None, self.decompress, payload)
+            if len(data) != size:
+                raise ValueError(f'decompressed data has wrong length: {len(data)} bytes for {width}x{height} pixels')
 
+        # With the pixels in hand, update the video buffer without yielding to other tasks.
         if self.data is None:
-            self.data = np.zeros((self.height, self.width, 4), 'B')
-        self.data[y:y + height, x:x + width] = np.ndarray((height, width, 4), 'B', data)
-        self.data[y:y + height, x:x + width, self.mode.index('a')] = 255
+            # Skip zeroing the buffer if this rectangle overwrites all of it.
+            if (x, y, width, height) == (0, 0, self.width, self.height):
+                self.data = np.empty((self.height, self.width, 4), 'B')
+            else:
+                self.data = np.zeros((self.height, self.width, 4), 'B')
+
+        # Copy pixels into place and make them opaque in a single pass.
+        pixels = self.data[y:y + height, x:x + width].view(np.uint32)
+        np.bitwise_or(np.ndarray(pixels.shape, np.uint32, data), alpha_masks[self.mode], out=pixels)
+
+    async def read_buffer(self, length: int) -> memoryview:
+        """
+        Reads *length* bytes into the scratch buffer, growing it if needed, and returns a view of them.
+        """
+
+        if len(self.buffer) < length:
+            self.buffer = bytearray(length)
+        view = memoryview(self.buffer)[:length]
+        await self.reader.readinto(view)
+        return view
 
     def as_rgba(self) -> np.ndarray:
         """
-        Returns the video buffer as a 3D RGBA array.
+        Returns the video buffer as a 3D RGBA array. Where possible this is a read-only view of the video buffer,
+        rather than a copy.
         """
 
         if self.data is None:
             return np.zeros((self.height, self.width, 4), 'B')
         if self.mode == 'rgba':
-            return self.data
-        if self.mode == 'abgr':
-            return self.data[:, :, ::-1]
-        return np.dstack((
-            self.data[:, :, self.mode.index('r')],
-            self.data[:, :, self.mode.index('g')],
-            self.data[:, :, self.mode.index('b')],
-            self.data[:, :, self.mode.index('a')]))
+            view = self.data.view()
+        elif self.mode == 'abgr':
+            view = self.data[:, :, ::-1]
+        else:
+            return self.data[:, :, rgba_indices[self.mode]]
+        view.flags.writeable = False
+        return view
 
     def is_complete(self):
         """
@@ -367,7 +545,11 @@ class Video:
 
         if self.data is None:
             return False
-        return self.data[:, :, self.mode.index('a')].all()
+        if self.data.size == 0:
+            return True
+        # Check a band of rows at a time, so a partially drawn frame is rejected early.
+        alpha = self.data[:, :, alpha_indices[self.mode]]
+        return all(alpha[y:y + 64].min() for y in range(0, self.height, 64))
 
     def detect_screens(self) -> List[Screen]:
         """
@@ -377,53 +559,73 @@ class Video:
         if self.data is None:
             return []
 
-        mask = self.data[:, :, self.mode.index('a')]
-        mask = np.pad(mask // 255, ((1, 1), (1, 1))).astype(np.int8)
+        mask = np.zeros((self.data.shape[0] + 2, self.data.shape[1] + 2), np.int8)
+        np.equal(self.data[:, :, alpha_indices[self.mode]], 255, out=mask[1:-1, 1:-1].view(np.bool_))
         mask_a = mask[1:, 1:]
         mask_b = mask[1:, :-1]
         mask_c = mask[:-1, 1:]
         mask_d = mask[:-1, :-1]
 
-        screens = []
+        screens: List[Screen] = []
         while True:
-            # Detect corners by ANDing perpendicular pairs of differences.
-            corners = product(
-                np.argwhere(mask_b - mask_a & mask_c - mask_a == -1),  # top left
-                np.argwhere(mask_a - mask_b & mask_d - mask_b == -1),  # top right
-                np.argwhere(mask_d - mask_c & mask_a - mask_c == -1),  # bottom left
-                np.argwhere(mask_c - mask_d & mask_b - mask_d == -1))  # bottom right
+            # Detect corners by looking up each 2x2 neighbourhood of the mask.
+            codes = corner_types.take(mask_a | mask_b << 1 | mask_c << 2 | mask_d << 3)
+            found = np.flatnonzero(codes)
+            kinds = codes.ravel()[found]
+            points = np.column_stack(np.divmod(found, codes.shape[1]))
+            top_left, top_right, bottom_left, bottom_right = (points[kinds & bit != 0].tolist() for bit in (1, 2, 4, 8))
+
+            # Index corners by row and column, so we only visit corners that line up.
+            top_right_rows: Dict[int, List[int]] = defaultdict(list)
+            top_right_cols: Dict[int, List[int]] = defaultdict(list)
+            bottom_left_rows: Dict[int, List[int]] = defaultdict(list)
+            bottom_left_cols: Dict[int, List[int]] = defaultdict(list)
+            bottom_right_rows: Dict[int, List[int]] = defaultdict(list)
+            bottom_right_cols: Dict[int, List[int]] = defaultdict(list)
+            for row, col in top_right:
+                top_right_rows[row].append(col)
+                top_right_cols[col].append(row)
+            for row, col in bottom_left:
+                bottom_left_rows[row].append(col)
+                bottom_left_cols[col].append(row)
+            for row, col in bottom_right:
+                bottom_right_rows[row].append(col)
+                bottom_right_cols[col].append(row)
 
             # Find cases where 3 corners align, forming an  'L' shape.
-            rects = set()
-            for a, b, c, d in corners:
-                ab = a[0] == b[0] and a[1] < b[1]  # top
-                cd = c[0] == d[0] and c[1] < d[1]  # bottom
-                ac = a[1] == c[1] and a[0] < c[0]  # left
-                bd = b[1] == d[1] and b[0] < d[0]  # right
-                if ab and ac:
-                    rects.add((a[1], a[0], b[1], c[0]))
-                if ab and bd:
-                    rects.add((a[1], a[0], d[1], d[0]))
-                if cd and ac:
-                    rects.add((a[1], a[0], d[1], d[0]))
-                if cd and bd:
-                    rects.add((c[1], b[0], d[1], d[0]))
-
-            # Create screen objects and sort them by their scores.
-            candidates = [Screen(int(x0), int(y0), int(x1 - x0), int(y1 - y0)) for x0, y0, x1, y1 in rects]
-            candidates.sort(key=lambda screen: screen.score, reverse=True)
-
-            # Find a single fully-opaque screen
-            for screen in candidates:
-                if mask_a[screen.slices].all():
-                    mask_a[screen.slices] = 0
-                    screens.append(screen)
-                    break
+            rects: List[Tuple[int, int, int, int]] = []
+            for y0, x0 in top_left:
+                for x1 in top_right_rows[y0]:
+                    if x1 > x0:
+                        rects.extend((x0, y0, x1, y1) for y1 in bottom_left_cols[x0] if y1 > y0)
+                        rects.extend((x0, y0, x1, y1) for y1 in bottom_right_cols[x1] if y1 > y0)
+                for y1 in bottom_left_cols[x0]:
+                    if y1 > y0:
+                        rects.extend((x0, y0, x1, y1) for x1 in bottom_right_rows[y1] if x1 > x0)
+            for y1, x1 in bottom_right:
+                for x0 in bottom_left_rows[y1]:
+                    if x0 < x1:
+                        rects.extend((x0, y0, x1, y1) for y0 in top_right_cols[x1] if y0 < y1)
+
+            # Build a summed-area table of the mask, and use it to check every candidate for opacity at once. Summing
+            # along rows first keeps the first pass contiguous, and 32-bit sums suffice for all but enormous frames.
+            sums = np.zeros((mask_a.shape[0] + 1, mask_a.shape[1] + 1), np.int32 if mask_a.size < 2 ** 31 else np.int64)
+            np.cumsum(mask_a, axis=1, out=sums[1:, 1:])
+            np.cumsum(sums[1:, 1:], axis=0, out=sums[1:, 1:])
+            bounds = np.unique(np.array(rects, np.intp).reshape(-1, 4), axis=0)
+            x0s, y0s, x1s, y1s = bounds.T
+            opaque = sums[y1s, x1s] - sums[y0s, x1s] - sums[y1s, x0s] + sums[y0s, x0s] == (x1s - x0s) * (y1s - y0s)
 
             # Finish up if no screens remain
-            else:
+            if not opaque.any():
                 return screens
 
+            # Pick the fully-opaque screen with the best score.
+            candidates = [Screen(x0, y0, x1 - x0, y1 - y0) for x0, y0, x1, y1 in bounds[opaque].tolist()]
+            screen = max(candidates, key=lambda screen: screen.score)
+            mask_a[screen.slices] = 0
+            screens.append(screen)
+
 
 class UpdateType(Enum):
     """
@@ -440,13 +642,17 @@ class UpdateType(Enum):
     BELL = 3
 
 
+# Update types by message type number
+update_types: Dict[int, UpdateType] = {update_type.value: update_type for update_type in UpdateType}
+
+
 @dataclass
 class Client:
     """
     VNC client.
     """
 
-    reader: StreamReader = field(repr=False)
+    reader: BufferedReader = field(repr=False)
     writer: StreamWriter = field(repr=False)
 
     #: The shared clipboard.
@@ -467,7 +673,7 @@ class Client:
     @classmethod
     async def create(
             cls,
-            reader: StreamReader,
+            reader: BufferedReader,
             writer: StreamWriter,
             username: Optional[str] = None,
             password: Optional[str] = None,
@@ -478,7 +684,7 @@ class Client:
             raise ValueError('not a VNC server')
         writer.write(b'RFB 003.008\n')
 
-        auth_types = set(await reader.readexactly(await read_int(reader, 1)))
+        auth_types = await reader.readexactly(await read_int(reader, 1))
         if not auth_types:
             raise ValueError(await read_text(reader, 'utf-8'))
         for auth_type in (33, 1, 2):
@@ -486,7 +692,7 @@ class Client:
                 writer.write(auth_type.to_bytes(1, 'big'))
                 break
         else:
-            raise ValueError(f'unsupported auth types: {auth_types}')
+            raise ValueError(f'unsupported auth types: {set(auth_types)}')
 
         # Apple authentication
         if auth_type == 33:
@@ -494,19 +700,16 @@ class Client:
                 raise ValueError('server requires username and password')
             if host_key is None:
                 writer.write(b'\x00\x00\x00\x0a\x01\x00RSA1\x00\x00\x00\x00')
-                await reader.readexactly(4)  # packet length
-                await reader.readexactly(2)  # packet version
-                host_key_length = await read_int(reader, 4)
+                host_key_length, = host_key_header.unpack(await reader.readexactly(host_key_header.size))
                 host_key = await reader.readexactly(host_key_length)
                 host_key = load_der_public_key(host_key)
                 await reader.readexactly(1)  # unknown
             aes_key = urandom(16)
-            cipher = Cipher(algorithms.AES(aes_key), modes.ECB())
-            encryptor = cipher.encryptor()
+            encryptor = Cipher(algorithms.AES(aes_key), modes.ECB()).encryptor()
             credentials = pack_ard(username) + pack_ard(password)
             writer.write(
                 b'\x00\x00\x01\x8a\x01\x00RSA1' +
-                b'\x00\x01' + encryptor.update(credentials) +
+                b'\x00\x01' + encryptor.update(credentials) + encryptor.finalize() +
                 b'\x00\x01' + host_key.encrypt(aes_key, padding=padding.PKCS1v15()))
             await reader.readexactly(4)  # unknown
 
@@ -515,7 +718,7 @@ class Client:
             if password is None:
                 raise ValueError('server requires password')
             des_key = password.encode('ascii')[:8].ljust(8, b'\x00')
-            des_key = bytes(int(bin(n)[:1:-1].ljust(8, '0'), 2) for n in des_key)
+            des_key = des_key.translate(reversed_bits)
             encryptor = Cipher(algorithms.TripleDES(des_key), modes.ECB()).encryptor()
             challenge = await reader.readexactly(16)
             writer.write(encryptor.update(challenge) + encryptor.finalize())
@@ -543,15 +746,18 @@ class Client:
         Reads an update from the server and returns its type.
         """
 
-        update_type = UpdateType(await read_int(self.reader, 1))
+        message_type = await read_int(self.reader, 1)
+        update_type = update_types.get(message_type)
+        if update_type is None:
+            raise ValueError(f'unsupported message type: {message_type}')
 
         if update_type is UpdateType.CLIPBOARD:
-            await self.reader.readexactly(3)  # padding
-            self.clipboard.text = await read_text(self.reader, 'latin-1')
+            length, = clipboard_text_header.unpack(await self.reader.readexactly(clipboard_text_header.size))
+            self.clipboard.text = (await self.reader.readexactly(length)).decode('latin-1')
 
         if update_type is UpdateType.VIDEO:
-            await self.reader.readexactly(1)  # padding
-            for _ in range(await read_int(self.reader, 2)):
+            rect_count, = update_header.unpack(await self.reader.readexactly(update_header.size))
+            for _ in range(rect_count):
                 await self.video.read()
 
         return update_type
@@ -591,7 +797,7 @@ async def connect(
 
     opener = opener or open_connection
     reader, writer = await opener(host, port)
-    client = await Client.create(reader, writer, username, password, host_key)
+    client = await Client.create(BufferedReader(reader), writer, username, password, host_key)
     try:
         yield client
     finally:
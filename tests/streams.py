@@ -0,0 +1,15 @@
+from asyncio import StreamReader, run
+from asyncvnc import BufferedReader
+
+
+def run_with_reader(func, data, **kwargs):
+    """
+    Feeds *data* into a stream, wraps it in a buffered reader, and returns the result of awaiting *func(reader)*.
+    """
+
+    async def main():
+        stream = StreamReader()
+        stream.feed_data(data)
+        stream.feed_eof()
+        return await func(BufferedReader(stream, **kwargs))
+    return run(main())
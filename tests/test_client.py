@@ -0,0 +1,45 @@
+from io import BytesIO
+from asyncvnc import Client, Clipboard, Keyboard, Mouse, UpdateType, Video
+from .streams import run_with_reader
+
+import pytest
+
+
+def read(data):
+    async def main(reader):
+        writer = BytesIO()
+        client = Client(
+            reader=reader,
+            writer=writer,
+            clipboard=Clipboard(writer),
+            keyboard=Keyboard(writer),
+            mouse=Mouse(writer),
+            video=Video(reader, writer, lambda data: data, 'DESKTOP', 2, 1, 'rgba'),
+            host_key=None)
+        return client, await client.read()
+    return run_with_reader(main, data)
+
+
+def test_read_video():
+    client, update_type = read(
+        b'\x00\x00\x00\x01'  # video update with 1 rect
+        b'\x00\x00\x00\x00\x00\x02\x00\x01\x00\x00\x00\x00'  # x=0 y=0 w=2 h=1 raw
+        b'\x01\x02\x03\x00\x04\x05\x06\x00')
+    assert update_type is UpdateType.VIDEO
+    assert client.video.data.tolist() == [[[1, 2, 3, 255], [4, 5, 6, 255]]]
+
+
+def test_read_clipboard():
+    client, update_type = read(b'\x02\x00\x00\x00\x00\x00\x00\x05hello')
+    assert update_type is UpdateType.CLIPBOARD
+    assert client.clipboard.text == 'hello'
+
+
+def test_read_bell():
+    client, update_type = read(b'\x03')
+    assert update_type is UpdateType.BELL
+
+
+def test_read_unsupported():
+    with pytest.raises(ValueError):
+        read(b'\x01')
@@ -1,5 +1,5 @@
 from io import BytesIO
-from asyncvnc import Keyboard
+from asyncvnc import Keyboard, key_codes
 
 import pytest
 
@@ -60,3 +60,18 @@ def test_write():
         b'\x04\x01\x00\x00\x00\x00\x00c'  # c down
         b'\x04\x00\x00\x00\x00\x00\x00c'  # c up
     )
+
+
+def test_write_added_keys(monkeypatch):
+    monkeypatch.setitem(key_codes, '\n', key_codes['Return'])
+    monkeypatch.setitem(key_codes, '\x01', 0x12345678)
+    keyboard = Keyboard(writer=BytesIO())
+    keyboard.write('a\n\x01')
+    assert keyboard.writer.getvalue() == (
+        b'\x04\x01\x00\x00\x00\x00\x00a'  # a down
+        b'\x04\x00\x00\x00\x00\x00\x00a'  # a up
+        b'\x04\x01\x00\x00\x00\x00\xff\x0d'  # Return down
+        b'\x04\x00\x00\x00\x00\x00\xff\x0d'  # Return up
+        b'\x04\x01\x00\x00\x12\x34\x56\x78'  # custom key down
+        b'\x04\x00\x00\x00\x12\x34\x56\x78'  # custom key up
+    )
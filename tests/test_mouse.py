@@ -34,3 +34,27 @@ def test_move():
     mouse = Mouse(writer=BytesIO())
     mouse.move(11, 22)
     assert mouse.writer.getvalue() == b'\x05\x00\x00\x0b\x00\x16'
+
+
+def test_move_path():
+    mouse = Mouse(writer=BytesIO())
+    with mouse.hold():
+        mouse.move_path([(0, 0), (1, 2), (1, 2), (3, 4)])
+    assert (mouse.x, mouse.y) == (3, 4)
+    assert mouse.writer.getvalue() == (
+        b'\x05\x01\x00\x00\x00\x00'  # LMB down
+        b'\x05\x01\x00\x01\x00\x02'  # move to (1, 2)
+        b'\x05\x01\x00\x03\x00\x04'  # move to (3, 4)
+        b'\x05\x00\x00\x03\x00\x04'  # LMB up
+    )
+
+
+def test_scroll_down():
+    mouse = Mouse(writer=BytesIO())
+    mouse.scroll_down(2)
+    assert mouse.writer.getvalue() == (
+        b'\x05\x10\x00\x00\x00\x00'  # wheel down
+        b'\x05\x00\x00\x00\x00\x00'  # wheel up
+        b'\x05\x10\x00\x00\x00\x00'  # wheel down
+        b'\x05\x00\x00\x00\x00\x00'  # wheel up
+    )
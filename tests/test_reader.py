@@ -0,0 +1,37 @@
+from asyncio import IncompleteReadError
+from .streams import run_with_reader
+
+import pytest
+
+
+def read(data, *lengths):
+    async def main(reader):
+        return [await reader.readexactly(length) if length else await reader.readline() for length in lengths]
+    return run_with_reader(main, data, chunk_size=4, line_limit=12)
+
+
+def test_readexactly():
+    assert read(b'abcdefghij', 1, 2, 3, 4) == [b'a', b'bc', b'def', b'ghij']
+
+
+def test_readexactly_large():
+    assert read(b'abcdefghij', 1, 9) == [b'a', b'bcdefghij']
+
+
+def test_readexactly_incomplete():
+    with pytest.raises(IncompleteReadError):
+        read(b'abc', 4)
+
+
+def test_readline():
+    assert read(b'RFB 003.008\nabc', 0, 3) == [b'RFB 003.008\n', b'abc']
+
+
+def test_readline_eof():
+    assert read(b'abc', 0, 0) == [b'abc', b'']
+
+
+@pytest.mark.parametrize('data', [b'RFB 003.008 \n', b'RFB 003.008 x', b'x' * 300000])
+def test_readline_too_long(data):
+    with pytest.raises(ValueError):
+        read(data, 0)
@@ -1,19 +1,44 @@
+from asyncio import StreamReader, create_task, run, sleep
 from io import BytesIO
-from asyncvnc import Video
+from zlib import compress, decompressobj
+from asyncvnc import BufferedReader, Screen, Video
+from .streams import run_with_reader
 import numpy as np
 import pytest
 
 
-@pytest.fixture
-def video():
+def make_video(width, height, mode, decompress=lambda data: data, **kwargs):
     return Video(
         reader=None,
         writer=BytesIO(),
-        decompress=lambda data: data,
+        decompress=decompress,
         name='DESKTOP',
-        width=11,
-        height=22,
-        mode='RGBA')
+        width=width,
+        height=height,
+        mode=mode,
+        **kwargs)
+
+
+def read(video, data):
+    async def main(reader):
+        video.reader = reader
+        await video.read()
+    run_with_reader(main, data)
+
+
+@pytest.fixture
+def video():
+    return make_video(11, 22, 'RGBA')
+
+
+def test_create():
+    video = run_with_reader(lambda reader: Video.create(reader, BytesIO()), (
+        b'\x07\x80\x04\x38'  # 1920x1080
+        b'\x20\x18\x00\xff\x00\xff\x00\xff\x00\xff\x10\x08\x00'  # bgra
+        b'\x00\x00\x00'  # padding
+        b'\x00\x00\x00\x07DESKTOP'))
+    assert (video.name, video.width, video.height, video.mode) == ('DESKTOP', 1920, 1080, 'bgra')
+    assert video.writer.getvalue() == b'\x01\x02\x00\x00\x01\x00\x00\x00\x06'
 
 
 def test_refresh(video):
@@ -27,5 +52,166 @@ def test_refresh_incremental(video):
     assert video.writer.getvalue() == b'\x03\x01\x00\x00\x00\x00\x00\x0b\x00\x16'
 
 
-# TODO: as_rgba()
-# TODO: detect_screens()
+def test_read_raw():
+    video = make_video(4, 3, 'rgba')
+    read(video, (
+        b'\x00\x01\x00\x02\x00\x02\x00\x01\x00\x00\x00\x00'  # x=1 y=2 w=2 h=1 raw
+        b'\x01\x02\x03\x00\x04\x05\x06\x00'))
+    assert video.data.shape == (3, 4, 4)
+    assert video.data[2, 1:3].tolist() == [[1, 2, 3, 255], [4, 5, 6, 255]]
+    assert video.data[:2].sum() == 0
+    assert not video.is_complete()
+
+
+def test_read_raw_full_width():
+    video = make_video(2, 2, 'bgra')
+    read(video, (
+        b'\x00\x00\x00\x01\x00\x02\x00\x01\x00\x00\x00\x00'  # x=0 y=1 w=2 h=1 raw
+        b'\x01\x02\x03\x00\x04\x05\x06\x00'))
+    assert video.data[1].tolist() == [[1, 2, 3, 255], [4, 5, 6, 255]]
+    assert video.data[0].sum() == 0
+
+
+def test_read_raw_full_frame():
+    video = make_video(1, 2, 'argb')
+    read(video, (
+        b'\x00\x00\x00\x00\x00\x01\x00\x02\x00\x00\x00\x00'  # x=0 y=0 w=1 h=2 raw
+        b'\x00\x01\x02\x03\x00\x04\x05\x06'))
+    assert video.data.tolist() == [[[255, 1, 2, 3]], [[255, 4, 5, 6]]]
+    assert video.is_complete()
+
+
+def test_read_raw_partial():
+    video = make_video(4, 2, 'bgra')
+    video.data = np.full((2, 4, 4), 255, 'B')
+
+    async def main():
+        stream = StreamReader()
+        video.reader = BufferedReader(stream)
+        stream.feed_data(b'\x00\x00\x00\x00\x00\x04\x00\x02\x00\x00\x00\x00')  # x=0 y=0 w=4 h=2 raw
+        stream.feed_data(b'\x01\x02\x03\x00' * 4)
+        task = create_task(video.read())
+        await sleep(0)
+        assert video.is_complete()
+        assert video.data.sum() == 255 * 32
+        stream.feed_data(b'\x01\x02\x03\x00' * 4)
+        await task
+    run(main())
+    assert video.data.tolist() == [[[1, 2, 3, 255]] * 4] * 2
+
+
+@pytest.mark.parametrize('header', [
+    b'\x00\x01\x00\x00\x00\x00\x00\x02\x00\x00\x00\x00',  # x=1 y=0 w=0 h=2 raw
+    b'\x00\x00\x00\x01\x00\x02\x00\x00\x00\x00\x00\x00',  # x=0 y=1 w=2 h=0 raw
+])
+def test_read_raw_empty(header):
+    video = make_video(2, 2, 'rgba')
+    read(video, header)
+    assert video.data.shape == (2, 2, 4)
+    assert video.data.sum() == 0
+
+
+@pytest.mark.parametrize('header', [
+    b'\x00\x03\x00\x00\x00\x02\x00\x01\x00\x00\x00\x00',  # x=3 y=0 w=2 h=1 raw
+    b'\x00\x00\x00\x02\x00\x01\x00\x02\x00\x00\x00\x00',  # x=0 y=2 w=1 h=2 raw
+])
+def test_read_out_of_bounds(header):
+    video = make_video(4, 3, 'rgba')
+    with pytest.raises(ValueError):
+        read(video, header + b'\x00' * 8)
+    assert video.data is None
+
+
+def test_read_unsupported_encoding():
+    video = make_video(2, 1, 'rgba')
+    with pytest.raises(ValueError):
+        read(video, b'\x00\x00\x00\x00\x00\x02\x00\x01\x00\x00\x00\x05')  # x=0 y=0 w=2 h=1 hextile
+    assert video.data is None
+
+
+@pytest.mark.parametrize('executor_threshold', [0, 65536])
+def test_read_zlib(executor_threshold):
+    video = make_video(2, 2, 'rgba', decompress=decompressobj().decompress, executor_threshold=executor_threshold)
+    data = compress(b'\x01\x02\x03\x00' * 2)
+    read(video, (
+        b'\x00\x00\x00\x00\x00\x01\x00\x02\x00\x00\x00\x06' +  # x=0 y=0 w=1 h=2 zlib
+        len(data).to_bytes(4, 'big') + data))
+    assert video.data[:, 0].tolist() == [[1, 2, 3, 255], [1, 2, 3, 255]]
+    assert video.data[:, 1].sum() == 0
+
+
+def test_read_zlib_too_long():
+    video = make_video(2, 2, 'rgba', decompress=decompressobj().decompress)
+    with pytest.raises(ValueError):
+        read(video, (
+            b'\x00\x00\x00\x00\x00\x01\x00\x02\x00\x00\x00\x06'  # x=0 y=0 w=1 h=2 zlib
+            b'\xff\xff\xff\xff'))
+    assert video.buffer == bytearray()
+
+
+@pytest.mark.parametrize('pixels', [b'\x01\x02\x03\x00', b'\x01\x02\x03\x00' * 3])
+def test_read_zlib_wrong_length(pixels):
+    video = make_video(1, 2, 'rgba', decompress=decompressobj().decompress)
+    data = compress(pixels)
+    with pytest.raises(ValueError):
+        read(video, (
+            b'\x00\x00\x00\x00\x00\x01\x00\x02\x00\x00\x00\x06' +  # x=0 y=0 w=1 h=2 zlib
+            len(data).to_bytes(4, 'big') + data))
+    assert video.data is None
+
+
+@pytest.mark.parametrize('mode, view', [('rgba', True), ('bgra', False), ('argb', False), ('abgr', True)])
+def test_as_rgba(video, mode, view):
+    video.mode = mode
+    video.data = np.zeros((22, 11, 4), 'B')
+    video.data[3, 4] = ['rgba'.index(channel) + 1 for channel in mode]
+    rgba = video.as_rgba()
+    assert rgba.shape == (22, 11, 4)
+    assert rgba[3, 4].tolist() == [1, 2, 3, 4]
+    assert rgba.sum() == 10
+    assert np.shares_memory(rgba, video.data) is view
+    assert rgba.flags.writeable is not view
+    assert video.data.flags.writeable
+
+
+def test_as_rgba_empty(video):
+    assert video.as_rgba().shape == (22, 11, 4)
+    assert not video.as_rgba().any()
+
+
+def test_detect_screens(video):
+    video.mode = 'bgra'
+    video.data = np.zeros((22, 11, 4), 'B')
+    assert video.detect_screens() == []
+
+    video.data[2:8, 1:9, 3] = 255
+    assert video.detect_screens() == [Screen(1, 2, 8, 6)]
+
+
+@pytest.mark.parametrize('rects', [
+    [Screen(0, 0, 32, 18), Screen(32, 0, 16, 10)],
+    [Screen(0, 4, 32, 18), Screen(32, 0, 16, 12)],
+    [Screen(20, 20, 30, 20), Screen(0, 0, 16, 9)],
+])
+def test_detect_screens_multiple(rects):
+    video = make_video(60, 40, 'argb')
+    video.data = np.zeros((40, 60, 4), 'B')
+    for screen in rects:
+        video.data[screen.slices + (0,)] = 255
+    assert video.detect_screens() == rects
+
+
+@pytest.mark.parametrize('y', [0, 63, 64, 99])
+def test_is_complete(y):
+    video = make_video(10, 100, 'argb')
+    video.data = np.full((100, 10, 4), 255, 'B')
+    assert video.is_complete()
+    video.data[y, 5, 0] = 0
+    assert not video.is_complete()
+
+
+@pytest.mark.parametrize('width, height', [(0, 10), (10, 0)])
+def test_is_complete_empty(width, height):
+    video = make_video(width, height, 'rgba')
+    video.data = np.zeros((height, width, 4), 'B')
+    assert video.is_complete()